@@ -1,62 +1,297 @@
 # app.py
 from __future__ import annotations
 import os
+import sqlite3
+import threading
+import time
 from pathlib import Path
+from typing import Any, Dict, Optional
 
+import click
 from dotenv import load_dotenv
-from flask import Flask, render_template, request, redirect, url_for, flash
+from flask import Blueprint, Flask, render_template, request, redirect, url_for, flash, abort, jsonify
+from flask.cli import with_appcontext
 from flask_cors import CORS
+from jinja2 import FileSystemBytecodeCache
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import configure_mappers
 
-from models import db, User, Movie
+from extensions import db
 from data_manager import DataManager
+from models import SCHEMA_VERSION, Movie, User
 
 # --- Env / App setup ---
 load_dotenv()
 
-app = Flask(__name__, template_folder="templates", static_folder="static")
-app.secret_key = os.getenv("FLASK_SECRET", "dev-secret")  # for flash messages
-CORS(app)
-
 # Ensure data dir exists
 BASE_DIR = Path(__file__).resolve().parent
 DATA_DIR = BASE_DIR / "data"
 DATA_DIR.mkdir(exist_ok=True)
 
+# Compiled templates persist across worker processes/restarts.
+# (auto_reload already follows app.debug, so production never re-stats templates.)
+JINJA_CACHE_DIR = DATA_DIR / "jinja_cache"
+JINJA_CACHE_DIR.mkdir(exist_ok=True)
+
 # SQLite file
 DB_PATH = DATA_DIR / "moviweb.sqlite"
-app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{DB_PATH}"
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
-# Init DB
-db.init_app(app)
+bp = Blueprint("main", __name__)
 data_manager = DataManager()
 
+# SQLite tuning applied to every new DB-API connection:
+# WAL lets readers run alongside the writer, synchronous=NORMAL drops the
+# per-commit fsync, and busy_timeout waits on a lock instead of failing.
+SQLITE_PRAGMAS = (
+    "journal_mode=WAL",
+    "synchronous=NORMAL",
+    "busy_timeout=5000",
+    "cache_size=-20000",
+    "temp_store=memory",
+    "foreign_keys=ON",
+)
+
+
+@event.listens_for(Engine, "connect")
+def _set_sqlite_pragmas(dbapi_conn, _conn_record):
+    if not isinstance(dbapi_conn, sqlite3.Connection):
+        return  # another backend (e.g. via SQLALCHEMY_DATABASE_URI): leave it alone
+    cur = dbapi_conn.cursor()
+    for pragma in SQLITE_PRAGMAS:
+        cur.execute(f"PRAGMA {pragma}")
+    cur.close()
+
+
+def _begin_immediate(conn):
+    # Take the write lock up front so a transaction never has to upgrade
+    # from a read lock mid-way (the usual source of SQLITE_BUSY).
+    conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+def _optimize_on_connect(dbapi_conn, _conn_record):
+    # Writer only: optimize may run ANALYZE, which a mode=ro reader cannot.
+    cur = dbapi_conn.cursor()
+    cur.execute("PRAGMA optimize=0x10002")
+    cur.close()
+
+
+# Long-lived processes re-run PRAGMA optimize so planner stats track the data.
+OPTIMIZE_INTERVAL = 3600  # seconds
+
+
+def _optimize_periodically(app: Flask):
+    while True:
+        time.sleep(OPTIMIZE_INTERVAL)
+        try:
+            with app.app_context(), db.engine.begin() as conn:
+                conn.exec_driver_sql("PRAGMA optimize")
+        except SQLAlchemyError as e:
+            app.logger.warning("PRAGMA optimize failed: %s", e)
+
+
+_optimize_lock = threading.Lock()
+_optimize_started = False
+
+
+def start_optimize_thread(app: Flask) -> None:
+    """
+    Starts the hourly PRAGMA optimize thread, at most once per process.
+    Only serving processes call this (gunicorn workers, the dev server): optimize
+    only analyzes tables queried on its own connection, so one-off processes such
+    as db-init or test apps have nothing to gain from it.
+    """
+    global _optimize_started
+    with _optimize_lock:
+        if _optimize_started:
+            return
+        _optimize_started = True
+    threading.Thread(target=_optimize_periodically, args=(app,), name="sqlite-optimize", daemon=True).start()
+
+
+@click.command("db-init")
+@with_appcontext
+def db_init_command():
+    """
+    Creates the database tables. Run once per deployment, not on worker start.
+    """
+    db.create_all()
+    click.echo("Database initialised.")
+
+
+def _year_part(raw, index: int):
+    # SQL-callable wrapper around DataManager._parse_year for the upgrade copy.
+    return DataManager._parse_year(None if raw is None else str(raw))[index]
+
+
+@click.command("db-upgrade")
+@with_appcontext
+def db_upgrade_command():
+    """
+    Brings a SQLite database created by an older release up to the current schema.
+    SQLite cannot change a column's collation, default or CHECK in place, so the
+    user and movie tables are rebuilt from the models and their rows copied over
+    (title_lower and year/year_text derived from the old columns). Safe to re-run:
+    PRAGMA user_version records that the file is current.
+    """
+    if db.engine.dialect.name != "sqlite":
+        raise click.ClickException("db-upgrade only supports SQLite.")
+
+    with db.engine.connect() as conn:
+        raw = conn.connection.dbapi_connection
+        if raw.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+            click.echo("Database schema is up to date.")
+            return
+        tables = {row[0] for row in raw.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        if not {"user", "movie"} <= tables:
+            raise click.ClickException("No existing tables found; run `flask db-init` instead.")
+
+        # Must be off before the transaction starts: dropping the old user table
+        # would otherwise cascade-delete every movie.
+        raw.execute("PRAGMA foreign_keys=OFF")
+        # Python's lower() and year parsing, so copied rows match what DataManager writes.
+        raw.create_function("py_lower", 1, str.lower, deterministic=True)
+        raw.create_function("py_year", 1, lambda v: _year_part(v, 0), deterministic=True)
+        raw.create_function("py_year_text", 1, lambda v: _year_part(v, 1), deterministic=True)
+        try:
+            with conn.begin():
+                _rebuild_tables(conn)
+        finally:
+            raw.execute("PRAGMA foreign_keys=ON")
+    click.echo("Database upgraded.")
+
+
+def _rebuild_tables(conn) -> None:
+    # Free up the index and trigger names, then move the old tables aside.
+    for kind, name in conn.exec_driver_sql(
+        "SELECT type, name FROM sqlite_master WHERE type IN ('index', 'trigger') "
+        "AND tbl_name IN ('user', 'movie') AND sql IS NOT NULL"
+    ).all():
+        conn.exec_driver_sql(f'DROP {kind.upper()} "{name}"')
+    conn.exec_driver_sql('ALTER TABLE movie RENAME TO movie__old')
+    conn.exec_driver_sql('ALTER TABLE "user" RENAME TO user__old')
+    old_movie_cols = {row[1] for row in conn.exec_driver_sql("PRAGMA table_info(movie__old)")}
+
+    # Creates the current tables, indexes and triggers and stamps user_version.
+    User.__table__.create(conn)
+    Movie.__table__.create(conn)
+
+    conn.exec_driver_sql(
+        'INSERT INTO "user" (id, name, created_at) '
+        "SELECT id, name, COALESCE(created_at, CURRENT_TIMESTAMP) FROM user__old"
+    )
+    if "year_text" in old_movie_cols:
+        year_cols = "year, year_text"
+    else:
+        year_cols = "py_year(year), py_year_text(year)"
+    # Orphaned movies (the old schema never enforced the FK) are left behind, and
+    # a repeated imdb_id per user is kept only on its oldest row (uq_movie_user_imdb).
+    conn.exec_driver_sql(
+        "INSERT INTO movie (id, title, title_lower, year, year_text, imdb_id, poster_url, "
+        "rating, created_at, user_id) "
+        f"SELECT m.id, m.title, py_lower(m.title), {year_cols}, "
+        "CASE WHEN m.id = (SELECT min(d.id) FROM movie__old d "
+        "WHERE d.user_id = m.user_id AND d.imdb_id = m.imdb_id) THEN m.imdb_id END, "
+        "m.poster_url, CASE WHEN m.rating BETWEEN 1 AND 10 THEN m.rating END, "
+        "COALESCE(m.created_at, CURRENT_TIMESTAMP), m.user_id "
+        'FROM movie__old m WHERE m.user_id IN (SELECT id FROM "user")'
+    )
+    conn.exec_driver_sql("DROP TABLE movie__old")
+    conn.exec_driver_sql("DROP TABLE user__old")
+    # Recount from scratch rather than trusting whatever the old file had.
+    conn.exec_driver_sql(
+        'UPDATE "user" SET movie_count = (SELECT count(*) FROM movie WHERE movie.user_id = "user".id)'
+    )
+
+
+def create_app(config: Optional[Dict[str, Any]] = None) -> Flask:
+    """
+    Application factory. `config` overrides the defaults; DATABASE_PATH moves
+    both the writer and the reader bind to another SQLite file.
+    Gunicorn entrypoint: "app:create_app()".
+    """
+    app = Flask(__name__, template_folder="templates", static_folder="static")
+    app.secret_key = os.getenv("FLASK_SECRET", "dev-secret")  # for flash messages
+    CORS(app)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(str(JINJA_CACHE_DIR))
+
+    app.config["DATABASE_PATH"] = DB_PATH
+    app.config.update(config or {})
+    db_path = app.config["DATABASE_PATH"]
+
+    app.config.setdefault("SQLALCHEMY_DATABASE_URI", f"sqlite:///{db_path}")
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config.setdefault("SQLALCHEMY_RECORD_QUERIES", False)  # no per-query timing records
+
+    # Default bind is the single writer: SQLite only ever admits one writer, so a
+    # one-connection pool queues writes in Python instead of failing with SQLITE_BUSY.
+    # pysqlite's own transaction handling is disabled so we can issue BEGIN IMMEDIATE.
+    # Both pools recycle connections every 30 min; DB_PREPING opts into a liveness
+    # check on every checkout (an extra round trip, so off by default).
+    pool_health = {
+        "pool_recycle": 1800,
+        "pool_pre_ping": app.config.get("DB_PREPING", False),
+    }
+    app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", {
+        "pool_size": 1,
+        "max_overflow": 0,
+        "connect_args": {"isolation_level": None},
+        **pool_health,
+    })
+    # Read-only bind for list views; under WAL these run alongside the writer.
+    # Sized for several concurrent requests per worker (gevent) without queuing.
+    app.config.setdefault("SQLALCHEMY_BINDS", {
+        "reader": {
+            "url": f"sqlite:///file:{db_path}?mode=ro&uri=true",
+            "pool_size": 10,
+            "max_overflow": 20,
+            **pool_health,
+        },
+    })
+
+    # Init DB
+    db.init_app(app)
+    # Models are imported by now (via data_manager); resolve relationships here
+    # rather than on the first query of the first request.
+    configure_mappers()
+    with app.app_context():
+        if db.engine.dialect.name == "sqlite":
+            event.listen(db.engine, "begin", _begin_immediate)
+            event.listen(db.engine, "connect", _optimize_on_connect)
+
+    app.register_blueprint(bp)
+    app.cli.add_command(db_init_command)
+    app.cli.add_command(db_upgrade_command)
+    return app
+
+
 # ---------- Error Handlers ----------
 
-@app.errorhandler(404)
+@bp.app_errorhandler(404)
 def not_found(e):
     return render_template("error.html", code=404, message="Resource not found."), 404
 
-@app.errorhandler(400)
+@bp.app_errorhandler(400)
 def bad_request(e):
     return render_template("error.html", code=400, message="Bad request."), 400
 
-@app.errorhandler(500)
+@bp.app_errorhandler(500)
 def server_error(e):
     return render_template("error.html", code=500, message="Internal server error."), 500
 
 
 # ---------- Routes ----------
 
-@app.route("/")
+@bp.route("/")
 def index():
     """
     Home page: list users and provide a form to create a new user.
     """
-    users = data_manager.get_users()
+    users = data_manager.get_users_with_counts()
     return render_template("index.html", users=users)
 
-@app.route("/users", methods=["POST"])
+@bp.route("/users", methods=["POST"])
 def create_user():
     """
     Form POST to create a new user.
@@ -67,18 +302,19 @@ def create_user():
         flash(err, "error")
     else:
         flash(f"User '{user.name}' created.", "success")
-    return redirect(url_for("index"))
+    return redirect(url_for(".index"))
 
-@app.route("/users/<int:user_id>/movies", methods=["GET"])
+@bp.route("/users/<int:user_id>/movies", methods=["GET"])
 def list_movies(user_id: int):
     """
     Shows all movies for a given user and the add-movie form.
     """
-    user = User.query.get_or_404(user_id)
-    movies = data_manager.get_movies(user_id)
+    user, movies = data_manager.get_user_movies(user_id)
+    if user is None:
+        abort(404)
     return render_template("movies.html", user=user, movies=movies)
 
-@app.route("/users/<int:user_id>/movies", methods=["POST"])
+@bp.route("/users/<int:user_id>/movies", methods=["POST"])
 def add_movie(user_id: int):
     """
     Adds a movie for the user (with OMDb enrichment).
@@ -92,9 +328,27 @@ def add_movie(user_id: int):
         flash(err, "error")
     else:
         flash(f"Movie '{movie.title}' added.", "success")
-    return redirect(url_for("list_movies", user_id=user_id))
+    return redirect(url_for(".list_movies", user_id=user_id))
 
-@app.route("/users/<int:user_id>/movies/<int:movie_id>/update", methods=["POST"])
+@bp.route("/users/<int:user_id>/movies/bulk", methods=["POST"])
+def bulk_add_movies(user_id: int):
+    """
+    JSON import: body is an array of at most MAX_BULK_MOVIES {"title": ..., "rating": ...}
+    objects (rating an integer 1..10 or omitted). Titles the user already has are
+    skipped; responds with the number added (404 if the user does not exist).
+    """
+    if data_manager.get_user(user_id) is None:
+        return jsonify(error="User not found."), 404
+    records = request.get_json(silent=True)
+    if not isinstance(records, list):
+        return jsonify(error="Expected a JSON array of movies."), 400
+
+    added, err = data_manager.bulk_add_movies(user_id, records)
+    if err:
+        return jsonify(error=err), 400
+    return jsonify(added=added), 201
+
+@bp.route("/users/<int:user_id>/movies/<int:movie_id>/update", methods=["POST"])
 def update_movie(user_id: int, movie_id: int):
     """
     Updates title/rating for a movie.
@@ -106,9 +360,9 @@ def update_movie(user_id: int, movie_id: int):
         flash(err, "error")
     else:
         flash(f"Movie '{movie.title}' updated.", "success")
-    return redirect(url_for("list_movies", user_id=user_id))
+    return redirect(url_for(".list_movies", user_id=user_id))
 
-@app.route("/users/<int:user_id>/movies/<int:movie_id>/delete", methods=["POST"])
+@bp.route("/users/<int:user_id>/movies/<int:movie_id>/delete", methods=["POST"])
 def delete_movie(user_id: int, movie_id: int):
     """
     Deletes a movie for a user.
@@ -118,11 +372,13 @@ def delete_movie(user_id: int, movie_id: int):
         flash(err, "error")
     else:
         flash("Movie deleted.", "success")
-    return redirect(url_for("list_movies", user_id=user_id))
+    return redirect(url_for(".list_movies", user_id=user_id))
 
 
 if __name__ == "__main__":
-    # Create tables on first run
-    with app.app_context():
-        db.create_all()
+    # Create tables first with: flask --app app db-init (db-upgrade for older files)
+    app = create_app()
+    # debug=True runs the reloader; only its child process serves requests.
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_optimize_thread(app)
     app.run(host="0.0.0.0", port=int(os.getenv("PORT", "5000")), debug=True)
\ No newline at end of file
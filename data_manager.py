@@ -1,17 +1,130 @@
 # data_manager.py
 from __future__ import annotations
+import functools
 import logging
 import os
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import List, Optional, Tuple, Dict, Any
 
 import requests
+from dotenv import load_dotenv
+from flask import Flask, current_app
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from sqlalchemy import Row, bindparam, delete, select, update
+from sqlalchemy.dialects.sqlite import insert
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import raiseload
 
-from models import db, User, Movie
+from extensions import db
+from models import User, Movie
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+# OMDb config is read once at import (loading .env first, as app.py does later).
+load_dotenv()
+_OMDB_API_KEY = os.getenv("OMDB_API_KEY")
+_OMDB_URL = "https://www.omdbapi.com/"
+if not _OMDB_API_KEY:
+    logger.warning("OMDB_API_KEY not set. Movies will not be enriched from OMDb.")
+
+# Shared HTTP session: keeps TLS connections to OMDb alive between requests.
+_SESSION = requests.Session()
+_SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=20,
+        pool_maxsize=50,
+        max_retries=Retry(total=2, backoff_factor=0.1, status_forcelist=[429, 500, 502, 503, 504]),
+    ),
+)
+
+
+# OMDb enrichment runs here, after the request that created the movie has returned.
+_ENRICH_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="omdb-enrich")
+
+# Upper bound on one bulk import: every new title costs an OMDb lookup, so a single
+# request must not be able to flood the enrichment pool or the API key's quota.
+MAX_BULK_MOVIES = 100
+
+
+# Write-path statements are built once at import; each call only supplies bound values,
+# so no per-request expression trees are constructed.
+_INSERT_USER_STMT = (
+    insert(User)
+    .values(name=bindparam("name"))
+    .on_conflict_do_nothing()
+    .returning(User)
+    .options(raiseload("*"))  # a brand-new user has no movies to selectin-load
+)
+_INSERT_MOVIE_STMT = (
+    insert(Movie)
+    .values(
+        user_id=bindparam("user_id"),
+        title=bindparam("title"),
+        title_lower=bindparam("title_lower"),
+        rating=bindparam("rating"),
+    )
+    .on_conflict_do_nothing(index_elements=[Movie.user_id, Movie.title_lower])
+    .returning(Movie)
+)
+_BULK_INSERT_MOVIE_STMT = (
+    insert(Movie.__table__)
+    .on_conflict_do_nothing(index_elements=[Movie.user_id, Movie.title_lower])
+    .returning(Movie.__table__.c.id, Movie.__table__.c.title)
+)
+# OR IGNORE: if the user already has this imdb_id under another title,
+# uq_movie_user_imdb turns that row's update into a no-op instead of an error.
+# Matching title_lower too makes a late lookup a no-op once the movie was renamed,
+# or deleted and its (reused) id given to another movie.
+_ENRICH_MOVIE_STMT = (
+    update(Movie.__table__)
+    .prefix_with("OR IGNORE", dialect="sqlite")
+    .where(
+        Movie.__table__.c.id == bindparam("movie_id"),
+        Movie.__table__.c.title_lower == bindparam("expected_title_lower"),
+    )
+    .values(
+        year=bindparam("new_year"),
+        year_text=bindparam("new_year_text"),
+        imdb_id=bindparam("new_imdb_id"),
+        poster_url=bindparam("new_poster_url"),
+    )
+)
+_DUP_MOVIE_STMT = (
+    select(Movie.id)
+    .where(Movie.user_id == bindparam("user_id"), Movie.title_lower == bindparam("title_lower"))
+    .limit(1)
+)
+
+
+@functools.lru_cache(maxsize=4096)
+def _fetch_omdb_cached(title_lower: str) -> Tuple[Optional[str], Optional[str], Optional[str], Optional[str]]:
+    """
+    OMDb lookup keyed on the lower-cased title. Returns (title, year, imdb_id, poster_url),
+    all None when OMDb has no match so misses are cached too. Network errors and other
+    OMDb errors (bad key, rate limit) raise, and lru_cache does not cache exceptions.
+    """
+    resp = _SESSION.get(
+        _OMDB_URL,
+        params={"t": title_lower, "apikey": _OMDB_API_KEY},
+        timeout=10,
+    )
+    resp.raise_for_status()
+    data = resp.json()
+    if str(data.get("Response")).lower() != "true":
+        if data.get("Error") == "Movie not found!":
+            return None, None, None, None
+        raise RuntimeError(f"OMDb error: {data.get('Error')}")
+    poster = data.get("Poster")
+    return (
+        data.get("Title"),
+        data.get("Year"),
+        data.get("imdbID"),
+        poster if poster not in (None, "N/A") else None,
+    )
+
 
 class DataManager:
     """
@@ -48,34 +161,70 @@ class DataManager:
 
         return t, r
 
+    @staticmethod
+    def _parse_year(raw: Optional[str]) -> Tuple[Optional[int], Optional[str]]:
+        """
+        Splits OMDb's Year field into (year, year_text).
+        "1995" -> (1995, None); ranges like "2010–2013" keep the start year plus
+        the original text; anything without a leading 4-digit year ("N/A") -> (None, None).
+        """
+        s = (raw or "").strip()
+        if len(s) >= 4 and s[:4].isdigit():
+            return int(s[:4]), (s if len(s) > 4 else None)
+        return None, None
+
+    @staticmethod
+    def _read_bind() -> Dict[str, Any]:
+        """
+        Bind arguments that route a query to the read-only 'reader' engine,
+        keeping list views off the single writer connection.
+        """
+        return {"bind": db.engines["reader"]}
+
     # ---------- Users ----------
 
-    def get_users(self) -> List[User]:
+    def get_users_with_counts(self) -> List[Row]:
         """
-        Returns all users ordered by name.
-        Never raises to the caller; logs and returns [] on error.
+        Returns (id, name, created_at, movie_count) rows for all users ordered by name.
+        movie_count is the trigger-maintained column, so no movie rows are scanned.
+        Returns [] on error.
         """
         try:
-            return User.query.order_by(User.name.asc()).all()
+            stmt = (
+                select(User.id, User.name, User.created_at, User.movie_count)
+                .order_by(User.name.collate("NOCASE").asc())
+            )
+            return db.session.execute(stmt, bind_arguments=self._read_bind()).all()
         except SQLAlchemyError as e:
-            logger.exception("get_users failed: %s", e)
+            logger.exception("get_users_with_counts failed: %s", e)
             return []
 
+    def get_user(self, user_id: int) -> Optional[User]:
+        """
+        Returns the user with the given id, or None if missing or on error.
+        """
+        try:
+            stmt = select(User).options(raiseload("*")).filter_by(id=user_id)
+            return db.session.execute(stmt, bind_arguments=self._read_bind()).scalar_one_or_none()
+        except SQLAlchemyError as e:
+            logger.exception("get_user failed: %s", e)
+            return None
+
     def create_user(self, name: str) -> Tuple[Optional[User], Optional[str]]:
         """
         Creates a user with unique name. Returns (user, error_message).
+        Uniqueness is enforced by the DB; a conflicting insert is a no-op.
         """
         try:
             norm = self._normalize_name(name)
             if not norm:
                 return None, "User name cannot be empty."
 
-            # Duplicate check
-            if User.query.filter(User.name.ilike(norm)).first():
+            user = db.session.scalars(_INSERT_USER_STMT, {"name": norm}).first()
+            if user is None:
+                db.session.rollback()
                 return None, f"User '{norm}' already exists."
 
-            user = User(name=norm)
-            db.session.add(user)
             db.session.commit()
             return user, None
         except SQLAlchemyError as e:
@@ -85,82 +234,122 @@ class DataManager:
 
     # ---------- Movies ----------
 
-    def get_movies(self, user_id: int) -> List[Movie]:
+    def get_user_movies(self, user_id: int) -> Tuple[Optional[Dict[str, Any]], List[Row]]:
         """
-        Returns movies for a given user (sorted by title).
-        Returns [] on error.
+        Returns (user, movies) for the movies page in one round trip: the user
+        outer-joined to their movies, sorted by title (case-insensitive).
+        user is {"id", "name"}, or None if missing or on error; movies are plain
+        Core rows with id, title, year, year_text, poster_url, rating.
         """
         try:
-            return Movie.query.filter_by(user_id=user_id).order_by(Movie.title.asc()).all()
+            stmt = (
+                select(
+                    User.id.label("user_id"),
+                    User.name.label("user_name"),
+                    Movie.id, Movie.title, Movie.year, Movie.year_text, Movie.poster_url, Movie.rating,
+                )
+                .outerjoin(Movie)
+                .where(User.id == user_id)
+                .order_by(Movie.title.collate("NOCASE").asc())
+            )
+            rows = db.session.execute(stmt, bind_arguments=self._read_bind()).all()
         except SQLAlchemyError as e:
-            logger.exception("get_movies failed: %s", e)
-            return []
+            logger.exception("get_user_movies failed: %s", e)
+            return None, []
+        if not rows:
+            return None, []
+        user = {"id": rows[0].user_id, "name": rows[0].user_name}
+        # A user without movies comes back as a single row of NULL movie columns
+        return user, [row for row in rows if row.id is not None]
 
     def _fetch_omdb(self, title: str) -> Dict[str, Any]:
         """
-        Fetches movie data from OMDb by title. Returns dict with keys:
-        title, year, imdb_id, poster_url. Missing fields set to None.
+        Fetches movie data from OMDb by title (cached, see _fetch_omdb_cached).
+        Returns dict with keys: title, year, imdb_id, poster_url. Missing fields set to None.
         Requires OMDB_API_KEY in environment or .env
         """
-        api_key = os.getenv("OMDB_API_KEY")
-        if not api_key:
-            logger.warning("OMDB_API_KEY not set. Skipping external fetch.")
+        if not _OMDB_API_KEY:
             return {"title": title, "year": None, "imdb_id": None, "poster_url": None}
 
         try:
-            resp = requests.get(
-                "https://www.omdbapi.com/",
-                params={"t": title, "apikey": api_key},
-                timeout=10,
-            )
-            resp.raise_for_status()
-            data = resp.json()
-            if str(data.get("Response")).lower() == "true":
-                return {
-                    "title": data.get("Title") or title,
-                    "year": data.get("Year"),
-                    "imdb_id": data.get("imdbID"),
-                    "poster_url": (data.get("Poster") if data.get("Poster") not in (None, "N/A") else None),
-                }
-            else:
-                # Fallback to user-provided title
-                return {"title": title, "year": None, "imdb_id": None, "poster_url": None}
+            found_title, year, imdb_id, poster_url = _fetch_omdb_cached(title.lower())
         except Exception as e:
             logger.exception("OMDb request failed: %s", e)
             return {"title": title, "year": None, "imdb_id": None, "poster_url": None}
 
+        # No match falls back to the user-provided title
+        return {"title": found_title or title, "year": year, "imdb_id": imdb_id, "poster_url": poster_url}
+
+    def _schedule_enrichment(self, movies: List[Tuple[int, str]]) -> None:
+        """
+        Queues OMDb enrichment for (movie_id, title) pairs. The lookups run
+        concurrently on the enrichment pool; one follow-up task then writes all
+        results in a single executemany UPDATE. No-op when OMDB_API_KEY is not configured.
+        """
+        if not _OMDB_API_KEY or not movies:
+            return
+        lookups = [
+            (movie_id, title.lower(), _ENRICH_POOL.submit(self._fetch_omdb, title))
+            for movie_id, title in movies
+        ]
+        # Submitted after its lookups (the pool is FIFO), so it never holds a worker
+        # waiting on a lookup that has not been picked up yet.
+        _ENRICH_POOL.submit(self._store_enrichment, current_app._get_current_object(), lookups)
+
+    def _store_enrichment(self, app: Flask, lookups: List[Tuple[int, str, Future]]) -> None:
+        """
+        Background writer for _schedule_enrichment. Each result is only written if the
+        row still has the title it was looked up for. Runs in its own app context
+        (and thus its own session); errors are logged, never raised.
+        """
+        rows = []
+        for movie_id, title_lower, lookup in lookups:
+            meta = lookup.result()  # _fetch_omdb never raises
+            if not (meta["year"] or meta["imdb_id"] or meta["poster_url"]):
+                continue
+            year, year_text = self._parse_year(meta["year"])
+            rows.append({
+                "movie_id": movie_id,
+                "expected_title_lower": title_lower,
+                "new_year": year,
+                "new_year_text": year_text,
+                "new_imdb_id": meta["imdb_id"],
+                "new_poster_url": meta["poster_url"],
+            })
+        if not rows:
+            return
+
+        with app.app_context():
+            try:
+                db.session.execute(_ENRICH_MOVIE_STMT, rows)
+                db.session.commit()
+            except SQLAlchemyError as e:
+                db.session.rollback()
+                logger.exception("store_enrichment failed: %s", e)
+
     def add_movie(self, user_id: int, title: str, rating: Optional[str | int]) -> Tuple[Optional[Movie], Optional[str]]:
         """
         Adds a movie for a given user. Returns (movie, error_message).
-        Validates duplicates per-user (case-insensitive).
-        Uses OMDb to enrich metadata.
+        Duplicates per-user (case-insensitive) are rejected by the DB's unique index.
+        OMDb metadata is filled in afterwards by a background enrichment task.
         """
         try:
             # Validate
             norm_title, norm_rating = self._validate_movie_input(title, rating)
 
-            # Duplicate (same user)
-            duplicate = (
-                Movie.query.filter(Movie.user_id == user_id)
-                .filter(Movie.title.ilike(norm_title))
-                .first()
-            )
-            if duplicate:
+            params = {
+                "user_id": user_id,
+                "title": norm_title,
+                "title_lower": norm_title.lower(),
+                "rating": norm_rating,
+            }
+            movie = db.session.scalars(_INSERT_MOVIE_STMT, params).first()
+            if movie is None:
+                db.session.rollback()
                 return None, f"Movie '{norm_title}' already exists for this user."
 
-            # Enrich via OMDb
-            meta = self._fetch_omdb(norm_title)
-
-            movie = Movie(
-                user_id=user_id,
-                title=meta["title"],
-                year=meta["year"],
-                imdb_id=meta["imdb_id"],
-                poster_url=meta["poster_url"],
-                rating=norm_rating,
-            )
-            db.session.add(movie)
             db.session.commit()
+            self._schedule_enrichment([(movie.id, norm_title)])
             return movie, None
         except ValueError as ve:
             return None, str(ve)
@@ -169,13 +358,57 @@ class DataManager:
             logger.exception("add_movie failed: %s", e)
             return None, "Database error while adding movie."
 
+    def bulk_add_movies(self, user_id: int, records: List[Dict[str, Any]]) -> Tuple[int, Optional[str]]:
+        """
+        Imports many movies for a user in one transaction (one executemany INSERT,
+        one commit). Every record is validated first; any invalid record rejects the
+        whole batch, as does a batch of more than MAX_BULK_MOVIES records.
+        Titles the user already has are skipped.
+        Returns (number_added, error_message).
+        """
+        if len(records) > MAX_BULK_MOVIES:
+            return 0, f"At most {MAX_BULK_MOVIES} movies can be imported at once."
+        rows = []
+        for i, record in enumerate(records, start=1):
+            if not isinstance(record, dict):
+                return 0, f"Movie #{i}: expected an object with 'title' and optional 'rating'."
+            if not isinstance(record.get("title"), str):
+                return 0, f"Movie #{i}: 'title' must be a string."
+            # JSON ratings must be real integers (bool is an int subclass; 7.9 is not 7)
+            rating = record.get("rating")
+            if rating is not None and (isinstance(rating, bool) or not isinstance(rating, int)):
+                return 0, f"Movie #{i}: 'rating' must be an integer between 1 and 10."
+            try:
+                norm_title, norm_rating = self._validate_movie_input(record["title"], rating)
+            except ValueError as ve:
+                return 0, f"Movie #{i}: {ve}"
+            rows.append({
+                "user_id": user_id,
+                "title": norm_title,
+                "title_lower": norm_title.lower(),
+                "rating": norm_rating,
+            })
+        if not rows:
+            return 0, None
+
+        try:
+            inserted = db.session.execute(_BULK_INSERT_MOVIE_STMT, rows).all()
+            db.session.commit()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            logger.exception("bulk_add_movies failed: %s", e)
+            return 0, "Database error while importing movies."
+
+        self._schedule_enrichment([(movie_id, movie_title) for movie_id, movie_title in inserted])
+        return len(inserted), None
+
     def update_movie(self, movie_id: int, title: Optional[str], rating: Optional[str | int]) -> Tuple[Optional[Movie], Optional[str]]:
         """
         Updates title/rating for a movie. Returns (movie, error_message).
         Applies same validation as add_movie; duplicate protection within user scope.
         """
         try:
-            movie = Movie.query.get(movie_id)
+            movie = db.session.get(Movie, movie_id)
             if not movie:
                 return None, "Movie not found."
 
@@ -185,28 +418,30 @@ class DataManager:
 
             new_title, new_rating = self._validate_movie_input(title or movie.title, rating if rating is not None else movie.rating)
 
+            title_changed = new_title.lower() != movie.title_lower
+
             # Duplicate check if title changed
-            if new_title.lower() != (movie.title or "").lower():
-                dup = (
-                    Movie.query.filter(Movie.user_id == movie.user_id)
-                    .filter(Movie.title.ilike(new_title))
-                    .first()
+            if title_changed:
+                dup = db.session.scalar(
+                    _DUP_MOVIE_STMT, {"user_id": movie.user_id, "title_lower": new_title.lower()}
                 )
                 if dup:
                     return None, f"Movie '{new_title}' already exists for this user."
 
             movie.title = new_title
+            movie.title_lower = new_title.lower()
             movie.rating = new_rating
 
-            # (Optional) re-enrich if title changed
-            if new_title.lower() != (movie.title or "").lower():
-                meta = self._fetch_omdb(new_title)
-                movie.title = meta["title"]
-                movie.year = meta["year"]
-                movie.imdb_id = meta["imdb_id"]
-                movie.poster_url = meta["poster_url"]
+            # Old metadata belongs to the old title; re-enrich in the background
+            if title_changed:
+                movie.year = None
+                movie.year_text = None
+                movie.imdb_id = None
+                movie.poster_url = None
 
             db.session.commit()
+            if title_changed:
+                self._schedule_enrichment([(movie.id, new_title)])
             return movie, None
         except ValueError as ve:
             return None, str(ve)
@@ -217,13 +452,15 @@ class DataManager:
 
     def delete_movie(self, movie_id: int) -> Optional[str]:
         """
-        Deletes a movie by id. Returns error message or None on success.
+        Deletes a movie by id in a single DELETE ... RETURNING (no SELECT first).
+        Returns error message or None on success.
         """
         try:
-            movie = Movie.query.get(movie_id)
-            if not movie:
+            table = Movie.__table__
+            stmt = delete(table).where(table.c.id == movie_id).returning(table.c.id)
+            if db.session.execute(stmt).scalar() is None:
+                db.session.rollback()
                 return "Movie not found."
-            db.session.delete(movie)
             db.session.commit()
             return None
         except SQLAlchemyError as e:
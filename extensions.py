@@ -0,0 +1,8 @@
+# extensions.py
+from __future__ import annotations
+from flask_sqlalchemy import SQLAlchemy
+
+# The one SQLAlchemy instance (and metadata/mapper registry) for the app.
+# Committed objects are only rendered afterwards; expiring them would cost a
+# refresh SELECT (plus relationship loads) on the writer for every flash message.
+db = SQLAlchemy(session_options={"expire_on_commit": False})
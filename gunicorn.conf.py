@@ -0,0 +1,41 @@
+# gunicorn.conf.py
+"""
+Gunicorn settings for MoviWebApp.
+Run with: gunicorn "app:create_app()"
+"""
+import multiprocessing
+import os
+
+# With preload_app the app (and `requests`/ssl) is imported in the master, before
+# the gevent worker would monkey-patch; patch here, ahead of that import.
+from gevent import monkey
+
+monkey.patch_all()
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+
+# The add-movie path blocks on OMDb over the network. gevent workers let one
+# process keep many such requests in flight; the stdlib (socket, ssl, threading,
+# time) is patched above so `requests` calls yield.
+worker_class = "gevent"
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+worker_connections = 1000
+
+# Import the app once in the master; workers fork with compiled code, Jinja
+# environment and SQLAlchemy metadata already in (copy-on-write) memory.
+preload_app = True
+
+
+def post_fork(server, worker):
+    # Connections must be opened post-fork: drop any pooled ones inherited from
+    # the master without closing them (they still belong to the master).
+    from app import start_optimize_thread
+    from extensions import db
+
+    app = server.app.wsgi()
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+    # PRAGMA optimize only analyzes tables queried on its own connection, so it
+    # has to run in the worker, whose connections serve the queries.
+    start_optimize_thread(app)
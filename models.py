@@ -1,9 +1,16 @@
 # models.py
 from __future__ import annotations
-from datetime import datetime
-from flask_sqlalchemy import SQLAlchemy
+from operator import attrgetter
 
-db = SQLAlchemy()
+from sqlalchemy import DDL, event
+from sqlalchemy.orm import deferred
+from sqlalchemy.sql import func
+
+from extensions import db
+
+# Fetched in one C-level call per repr (models show up in debug logs of whole lists).
+_user_repr_fields = attrgetter("id", "name")
+_movie_repr_fields = attrgetter("id", "title", "user_id", "rating")
 
 
 class User(db.Model):
@@ -11,20 +18,31 @@ class User(db.Model):
     User model representing an account that owns a list of favorite movies.
     """
     __tablename__ = "user"
+    # Don't re-SELECT server defaults (created_at) after a flush; read them only when used.
+    __mapper_args__ = {"eager_defaults": False}
 
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(120), unique=True, nullable=False)
-    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # Identity renders as GENERATED BY DEFAULT AS IDENTITY on PostgreSQL (no separate
+    # sequence) and is a no-op on SQLite, where an INTEGER PK is already the rowid.
+    id = db.Column(db.Integer, db.Identity(always=False), primary_key=True)
+    # NOCASE makes the unique index case-insensitive (create_user relies on it via
+    # ON CONFLICT) and lets the same index serve ORDER BY name.
+    name = db.Column(db.String(120, collation="NOCASE"), nullable=False, unique=True)
+    created_at = db.Column(db.DateTime, nullable=False, server_default=func.now())
+    # Denormalised len(movies) for the home page, maintained by the movie triggers below.
+    # Those triggers only exist on SQLite (and are created by db-init / db-upgrade);
+    # on any other backend this column stays 0.
+    movie_count = db.Column(db.Integer, nullable=False, server_default="0")
 
     movies = db.relationship(
         "Movie",
-        backref="user",
+        back_populates="user",
+        lazy="selectin",  # one IN-batched SELECT per page of users, never "dynamic"
         cascade="all, delete-orphan",
         passive_deletes=True,
-    )
+    )  # unordered; callers that display a list order it in their own query
 
     def __repr__(self) -> str:
-        return f"<User id={self.id} name='{self.name}'>"
+        return "<User id=%s name=%r>" % _user_repr_fields(self)
 
     def __str__(self) -> str:
         return self.name
@@ -35,24 +53,91 @@ class Movie(db.Model):
     Movie model representing one favorite movie that belongs to a user.
     """
     __tablename__ = "movie"
+    __mapper_args__ = {"eager_defaults": False}
 
-    id = db.Column(db.Integer, primary_key=True)
-    title = db.Column(db.String(255), nullable=False)
-    year = db.Column(db.String(10), nullable=True)
+    id = db.Column(db.Integer, db.Identity(always=False), primary_key=True)
+    title = db.Column(db.String(200, collation="NOCASE"), nullable=False)
+    title_lower = db.Column(db.String(200), nullable=False)  # lower(title), kept in sync by DataManager
+    year = db.Column(db.SmallInteger, nullable=True)  # release (or start) year
+    year_text = db.Column(db.String(16), nullable=True)  # only for OMDb ranges, e.g. "2010–2013"
     imdb_id = db.Column(db.String(32), nullable=True)
-    poster_url = db.Column(db.String(512), nullable=True)
-    rating = db.Column(db.Integer, nullable=True)  # 1..10 (user-given)
-    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # Deferred: ORM loads (e.g. User.movies) skip it; the list page selects it explicitly.
+    poster_url = deferred(db.Column(db.String(400), nullable=True))
+    rating = db.Column(db.SmallInteger, nullable=True)  # 1..10 (user-given)
+    created_at = db.Column(db.DateTime, nullable=False, server_default=func.now())
 
+    # No single-column index: the composite indexes below all lead with user_id.
     user_id = db.Column(
         db.Integer,
         db.ForeignKey("user.id", ondelete="CASCADE"),
         nullable=False,
-        index=True,
+    )
+    # Per-row user lookups (e.g. m.user.name in a loop) raise instead of issuing N
+    # SELECTs; load it explicitly with joinedload(Movie.user) where it is needed.
+    user = db.relationship("User", back_populates="movies", lazy="raise_on_sql")
+
+    __table_args__ = (
+        # Per-user case-insensitive uniqueness; also serves update_movie's duplicate probe.
+        db.Index("uq_movie_user_title_lower", user_id, title_lower, unique=True),
+        # Per-user listing in (case-insensitive) title order straight off the index.
+        db.Index("ix_movie_user_title", user_id, title),
+        # "My favourites from the 90s": user_id equality, then a year range scan.
+        db.Index("ix_movie_user_year", user_id, year),
+        # "Top-rated favourites": ORDER BY rating DESC LIMIT n as an ordered range scan.
+        db.Index("ix_movie_user_rating", user_id, rating.desc()),
+        # One row per OMDb title per user, once enrichment has resolved imdb_id.
+        db.Index(
+            "uq_movie_user_imdb",
+            user_id,
+            imdb_id,
+            unique=True,
+            sqlite_where=imdb_id.isnot(None),
+            postgresql_where=imdb_id.isnot(None),
+        ),
+        db.CheckConstraint("rating IS NULL OR (rating BETWEEN 1 AND 10)", name="ck_movie_rating_range"),
     )
 
     def __repr__(self) -> str:
-        return f"<Movie id={self.id} title='{self.title}' user_id={self.user_id}>"
+        return "<Movie id=%s title=%r user_id=%s rating=%r>" % _movie_repr_fields(self)
 
     def __str__(self) -> str:
-        return f"{self.title} ({self.year or 'n/a'})"
\ No newline at end of file
+        return f"{self.title} ({self.year_text or self.year or 'n/a'})"
+
+
+# Keep user.movie_count in step with the movie table inside the same transaction,
+# whichever path writes (ORM, Core bulk insert, or the ON DELETE CASCADE from user).
+# SQLite only; created with the movie table, or by `flask db-upgrade` for older files.
+_MOVIE_COUNT_TRIGGERS = (
+    """
+    CREATE TRIGGER trg_movie_count_insert AFTER INSERT ON movie
+    BEGIN
+        UPDATE "user" SET movie_count = movie_count + 1 WHERE id = NEW.user_id;
+    END
+    """,
+    """
+    CREATE TRIGGER trg_movie_count_delete AFTER DELETE ON movie
+    BEGIN
+        UPDATE "user" SET movie_count = movie_count - 1 WHERE id = OLD.user_id;
+    END
+    """,
+    """
+    CREATE TRIGGER trg_movie_count_move AFTER UPDATE OF user_id ON movie
+    WHEN NEW.user_id IS NOT OLD.user_id
+    BEGIN
+        UPDATE "user" SET movie_count = movie_count - 1 WHERE id = OLD.user_id;
+        UPDATE "user" SET movie_count = movie_count + 1 WHERE id = NEW.user_id;
+    END
+    """,
+)
+for _ddl in _MOVIE_COUNT_TRIGGERS:
+    event.listen(Movie.__table__, "after_create", DDL(_ddl).execute_if(dialect="sqlite"))
+
+
+# Bumped whenever the SQLite schema above changes in a way `flask db-upgrade` must
+# apply to existing files; stored in PRAGMA user_version when the tables are created.
+SCHEMA_VERSION = 1
+event.listen(
+    Movie.__table__,
+    "after_create",
+    DDL(f"PRAGMA user_version = {SCHEMA_VERSION}").execute_if(dialect="sqlite"),
+)